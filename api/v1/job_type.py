@@ -1,3 +1,4 @@
+from concurrent.futures import as_completed, TimeoutError as FuturesTimeoutError
 from queue import Empty
 
 from flask_restful import Resource
@@ -14,18 +15,32 @@ class API(Resource):
         self.module = module
 
     def get(self, project_id: int, test_uid: str):
-        self.module.context.rpc_manager.call.project_get_or_404(project_id=project_id)
-        for plugin in self.module.job_type_rpcs:
-            try:
-                job_type = self.module.context.rpc_manager.call_function_with_timeout(
-                    func=f'{plugin}_job_type_by_uid',
-                    timeout=2,
-                    project_id=project_id,
-                    test_uid=test_uid
-                )
+        rpc_manager = self.module.context.rpc_manager
+        rpc_manager.call.project_get_or_404(project_id=project_id)
+        # probes are independent, so ask all plugins at once and take the first hit
+        futures = [
+            self.module.rpc_executor.submit(
+                rpc_manager.call_function_with_timeout,
+                func=f'{plugin}_job_type_by_uid',
+                timeout=2,
+                project_id=project_id,
+                test_uid=test_uid
+            )
+            for plugin in self.module.job_type_rpcs
+        ]
+        try:
+            for future in as_completed(futures, timeout=5):
+                try:
+                    job_type = future.result()
+                except Empty:
+                    continue
                 if job_type:
                     return {'job_type': job_type}, 200
-            except Empty:
-                ...
+        except FuturesTimeoutError:
+            # probes still running by now are treated as unavailable
+            log.warning('job type probes timed out for test [%s]', test_uid)
+        finally:
+            for future in futures:
+                future.cancel()
 
         return {'job_type': 'not_found'}, 200  # intentionally not 404
@@ -1,36 +1,43 @@
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from queue import Empty
 from pylon.core.tools import log
 from ...tools.api_tools import APIBase, APIModeHandler
 
 
+def _safe_call(rpc_manager, fn_name: str, *args, label: str, project_id=None):
+    try:
+        return getattr(rpc_manager.timeout(3), fn_name)(*args)
+    except Empty:
+        log.warning('Cannot get %s for project [%s]', label, project_id)
+        return []
+
+
 class ProjectApi(APIModeHandler):
     def get(self, project_id: int):
-        resp = {
-            'public_regions': [],
-            'project_regions': [],
-            'cloud_regions': []
-        }
-        try:
-            resp['public_regions'] = self.module.context.rpc_manager.timeout(
-                3
-            ).get_rabbit_queues("carrier", True)
-        except Empty:
-            log.warning('Cannot get %s for project [%s]', 'public_regions', project_id)
-        try:
-            resp['project_regions'] = self.module.context.rpc_manager.timeout(
-                3
-            ).get_rabbit_queues(f"project_{project_id}_vhost")
-        except Empty:
-            log.warning('Cannot get %s for project [%s]', 'project_regions', project_id)
-        try:
-            resp['cloud_regions'] = self.module.context.rpc_manager.timeout(
-                3
-            ).integrations_get_cloud_integrations(
-                project_id
+        rpc_manager = self.module.context.rpc_manager
+        jobs = (
+            ('public_regions', 'get_rabbit_queues', ("carrier", True)),
+            ('project_regions', 'get_rabbit_queues', (f"project_{project_id}_vhost",)),
+            ('cloud_regions', 'integrations_get_cloud_integrations', (project_id,)),
+        )
+        futures = {
+            label: self.module.rpc_executor.submit(
+                _safe_call, rpc_manager, fn_name, *args,
+                label=label, project_id=project_id
             )
-        except Empty:
-            log.warning('Cannot get %s for project [%s]', 'cloud_regions', project_id)
-            # return resp, 400
+            for label, fn_name, args in jobs
+        }
+        resp = dict()
+        # rpc calls time out after 3s, the rest covers waiting for a pool worker
+        deadline = time.monotonic() + 5
+        for label, future in futures.items():
+            try:
+                resp[label] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FuturesTimeoutError:
+                future.cancel()
+                log.warning('Cannot get %s for project [%s]', label, project_id)
+                resp[label] = []
         return resp, 200
 
 
@@ -1,36 +1,60 @@
+import heapq
+from html import escape
+from functools import lru_cache
 from datetime import datetime
-from typing import Union
+from typing import Union, Optional
 
 from pylon.core.tools import log
 from bs4 import BeautifulSoup
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_BADGE_CLASSES = (
+    'badge-primary',
+    'badge-secondary',
+    'badge-success',
+    'badge-danger',
+    'badge-warning',
+    'badge-info',
+    'badge-light',
+    'badge-dark',
+)
+_BADGE_OPEN = {cls: f'<span class="badge mr-1 {cls}">' for cls in _BADGE_CLASSES}
+_BADGE_CLOSE = '</span>'
+
 
 def tag_format(tags):
-    badge_classes = {
-        'badge-primary': 0,
-        'badge-secondary': 0,
-        'badge-success': 0,
-        'badge-danger': 0,
-        'badge-warning': 0,
-        'badge-info': 0,
-        'badge-light': 0,
-        'badge-dark': 0,
-    }
+    badge_classes = dict.fromkeys(_BADGE_CLASSES, 0)
+    # (usage count, declaration order, class) - entries may lag behind badge_classes
+    # and are refreshed lazily when they reach the top
+    badge_heap = [(0, idx, cls) for idx, cls in enumerate(_BADGE_CLASSES)]
     tag_badge_mapping = dict()
 
     result = []
     for tag in tags:
-        chosen_class = tag_badge_mapping.get(tag, sorted(badge_classes, key=badge_classes.get)[0])
+        chosen_class = tag_badge_mapping.get(tag)
+        if chosen_class is None:
+            count, idx, chosen_class = badge_heap[0]
+            while count != badge_classes[chosen_class]:
+                heapq.heapreplace(badge_heap, (badge_classes[chosen_class], idx, chosen_class))
+                count, idx, chosen_class = badge_heap[0]
+            tag_badge_mapping[tag] = chosen_class
         badge_classes[chosen_class] += 1
-        tag_badge_mapping[tag] = chosen_class
-        result.append(f'<span class="badge mr-1 {chosen_class}">{tag}</span>')
+        result.append(_BADGE_OPEN[chosen_class])
+        result.append(escape(str(tag)))
+        result.append(_BADGE_CLOSE)
 
     return ''.join(result)
 
 
 def extract_tags(markup, tags: list = ['script', 'style']):
     soup = BeautifulSoup(markup, 'html.parser')
+    if not tags:
+        return str(soup), ''
     extracted = [s.extract() for s in soup(tags)]
     return str(soup), ''.join(map(str, extracted))
 
@@ -40,24 +64,47 @@ def map_method_call(lst: list, method_name: str):
     return [getattr(i, method_name)() for i in lst]
 
 
+def _dumps(data, indent: Optional[int] = None) -> str:
+    # orjson only knows how to indent by 2
+    if orjson and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(data, option=option).decode()
+        except TypeError:
+            # e.g. ints wider than 64 bits, json handles those
+            ...
+    return json.dumps(data, ensure_ascii=False, indent=indent)
+
+
 def list_pd_to_json(lst: list):
-    return json.dumps([i.dict() for i in lst], ensure_ascii=False)
+    return _dumps([i.dict() for i in lst])
 
 
 def pretty_json(data: Union[dict, str], indent: int = 2):
     d = data
+    constants = []
     if isinstance(data, str):
-        d = json.loads(data)
+        # json, unlike orjson, keeps big ints exact and reads NaN and Infinity
+        d = json.loads(data, parse_constant=lambda name: constants.append(name) or float(name))
     try:
-        return json.dumps(d, ensure_ascii=False, indent=indent)
+        if constants:
+            # orjson would write those as null
+            return json.dumps(d, ensure_ascii=False, indent=indent)
+        return _dumps(d, indent=indent)
     except Exception as e:
         log.warning('pretty_json Error %s', e)
     return ''
 
 
+@lru_cache(maxsize=4096)
+def _format_timestamp_ms(timestamp_ms: int) -> str:
+    return format_datetime(datetime.fromtimestamp(timestamp_ms/1000.0))
+
+
 def humanize_timestamp(timestamp: str):
-    dt = datetime.fromtimestamp(int(timestamp)/1000.0)
-    return format_datetime(dt)
+    return _format_timestamp_ms(int(timestamp))
 
 
 def format_datetime(dt: datetime):
@@ -27,11 +27,14 @@ class TestParameter(BaseModel):
     def get_real_type(cls, type_: str, name: str) -> type:
         if isinstance(type_, type):
             return type_
-        if cls._type_mapping_by_name.get(name):
-            return cls._type_mapping_by_name.get(name)
-        elif cls.__type_mapping.get(type_):
-            return cls.__type_mapping.get(type_)
-        return str
+        return cls._type_mapping_by_name.get(name) or cls.__type_mapping.get(type_) or str
+
+    @classmethod
+    def register_type(cls, name: str, type_: type) -> None:
+        # copy on first write so that subclasses do not leak into the parent mapping
+        if '_type_mapping_by_name' not in cls.__dict__:
+            cls._type_mapping_by_name = dict(cls._type_mapping_by_name)
+        cls._type_mapping_by_name[name] = type_
 
     @validator('default')
     def convert_default_type(cls, value, values):
@@ -77,16 +80,14 @@ class TestParamsBase(BaseModel):
         return instance
 
     def update(self, other: ForwardRef('TestParamsBase')) -> None:
-        test_params_names = set(map(lambda tp: tp.name, other.test_parameters))
-        modified_params = other.test_parameters
+        merged = {tp.name: tp for tp in other.test_parameters}
         for tp in self.test_parameters:
-            if tp.name not in test_params_names:
-                modified_params.append(tp)
-        self.test_parameters = modified_params
+            merged.setdefault(tp.name, tp)
+        self.test_parameters = list(merged.values())
 
     @validator('test_parameters')
     def required_test_param(cls, value):
-        lacking_values = cls._required_params.difference(set(i.name for i in value))
+        lacking_values = cls._required_params.difference({i.name for i in value})
         assert not lacking_values, f'The following parameters are required: {", ".join(lacking_values)}'
         return value
 
@@ -14,7 +14,9 @@
 
 """ Module """
 
+import importlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from pylon.core.tools import module, log  # pylint: disable=E0611,E0401
 
@@ -28,6 +30,7 @@ class Module(module.ModuleModel):
         self.db = None
         self.mongo = None
         self.job_type_rpcs = set()
+        self.rpc_executor = None
 
     def init(self):
         """ Init module """
@@ -42,6 +45,13 @@ class Module(module.ModuleModel):
         self.descriptor.register_tool('constants', _config)
         self.descriptor.register_tool('config', _config)
 
+        # One pool for fanning out independent RPC calls, shared by all API requests:
+        # when it is busy, calls of concurrent requests queue up behind each other
+        self.rpc_executor = ThreadPoolExecutor(
+            max_workers=_config.SHARED_RPC_WORKERS,
+            thread_name_prefix="shared_rpc"
+        )
+
         # from .tools.config import Config
         # self.descriptor.register_tool('config', Config())
 
@@ -56,9 +66,12 @@ class Module(module.ModuleModel):
         self.db = db
         self.descriptor.register_tool('db', db)
 
-        from .tools import db_tools, db_migrations
+        from .patterns import LazyTool
+        from .tools import db_tools
         self.descriptor.register_tool('db_tools', db_tools)
-        self.descriptor.register_tool('db_migrations', db_migrations)
+        self.descriptor.register_tool('db_migrations', LazyTool(
+            lambda: importlib.import_module('.tools.db_migrations', __package__)
+        ))
 
         # self.context.app.config.from_object(self.config)
         from .init_db import init_db
@@ -76,8 +89,9 @@ class Module(module.ModuleModel):
         except:  # pylint: disable=W0702
             log.exception("Vault failed to init, secrets WONT WORK")
 
-        from .tools import data_tools
-        self.descriptor.register_tool('data_tools', data_tools)
+        self.descriptor.register_tool('data_tools', LazyTool(
+            lambda: importlib.import_module('.tools.data_tools', __package__)
+        ))
 
         from .tools.flow_tools import FlowNodes
         self.descriptor.register_tool('flow_tools', FlowNodes(self))
@@ -106,15 +120,21 @@ class Module(module.ModuleModel):
     def deinit(self):  # pylint: disable=R0201
         """ De-init module """
         log.info("De-initializing module Shared")
+        if self.rpc_executor is not None:
+            self.rpc_executor.shutdown(wait=False, cancel_futures=True)
+        from .tools import api_tools
+        api_tools.shutdown_metrics()
 
     def init_filters(self):
         # Register custom Jinja filters
         from .filters import tag_format, extract_tags, list_pd_to_json, \
             map_method_call, pretty_json, humanize_timestamp, format_datetime
-        self.context.app.template_filter()(tag_format)
-        self.context.app.template_filter()(extract_tags)
-        self.context.app.template_filter()(list_pd_to_json)
-        self.context.app.template_filter()(map_method_call)
-        self.context.app.template_filter()(pretty_json)
-        self.context.app.template_filter()(humanize_timestamp)
-        self.context.app.template_filter()(format_datetime)
+        self.context.app.jinja_env.filters.update({
+            'tag_format': tag_format,
+            'extract_tags': extract_tags,
+            'list_pd_to_json': list_pd_to_json,
+            'map_method_call': map_method_call,
+            'pretty_json': pretty_json,
+            'humanize_timestamp': humanize_timestamp,
+            'format_datetime': format_datetime,
+        })
@@ -56,3 +56,27 @@ class SingletonParametrizedMeta(type):
 
 class SingletonParametrizedABC(SingletonParametrizedMeta, ABCMeta):
     ...
+
+
+class LazyTool:
+    """ Proxy that imports the wrapped tool on first attribute access or call """
+
+    def __init__(self, loader: Callable):
+        self.__dict__['_loader'] = loader
+        self.__dict__['_target'] = None
+
+    def _resolve(self):
+        target = self.__dict__['_target']
+        if target is None:
+            target = self.__dict__['_loader']()
+            self.__dict__['_target'] = target
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
@@ -12,56 +12,307 @@
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
 import operator
+import os
 import time
 from datetime import datetime
-from json import loads
-from typing import Union, Optional, Callable, Tuple
-from functools import wraps
+from typing import Union, Optional, Callable, Tuple, BinaryIO, Iterator
+from functools import wraps, lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
 from urllib.parse import ParseResult, urlparse, urlunparse
 
+from json import dumps
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
 from pylon.core.tools import log
-from sqlalchemy import and_, SQLColumnExpression
-from sqlalchemy.orm import joinedload
+from sqlalchemy import and_, or_, func, inspect, select, SQLColumnExpression
+from sqlalchemy.orm import joinedload, selectinload, raiseload
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
 from flask_restful import Resource, abort
-from flask import request, after_this_request
+from flask import request, after_this_request, g, has_request_context
 from werkzeug.utils import secure_filename
 
 from .minio_client import MinioClient, MinioClientAdmin
 from .rpc_tools import RpcMixin
 
 from tools import config as c
-from .db import with_project_schema_session
+from .db import with_project_schema_session, session as db_session
 from pylon.core.tools.event import EventManager
 
+PROJECT_CHECK_TTL = 30  # seconds
+_HTTP_METHODS = frozenset({'get', 'post', 'put', 'delete', 'head', 'options', 'patch'})
+
+
+@lru_cache(maxsize=1024)
+def _get_project_id(project_id: int, rpc_manager, ttl_bucket: int) -> int:
+    # ttl_bucket only makes entries expire, see _project_id
+    return rpc_manager.call.project_get_or_404(project_id=project_id).id
+
+
+def _project_id(project_id: int, rpc_manager) -> int:
+    """ project_get_or_404 result, memoized per request and for up to PROJECT_CHECK_TTL seconds """
+    if not has_request_context():
+        return _get_project_id(project_id, rpc_manager, int(time.monotonic() // PROJECT_CHECK_TTL))
+    request_cache = g.setdefault('_shared_project_ids', {})
+    try:
+        return request_cache[project_id]
+    except KeyError:
+        result = _get_project_id(project_id, rpc_manager, int(time.monotonic() // PROJECT_CHECK_TTL))
+        request_cache[project_id] = result
+        return result
+
+
+_rpc_manager = None
+
+
+def _default_rpc_manager():
+    """ RpcMixin().rpc, resolved once for the module """
+    global _rpc_manager
+    if _rpc_manager is None:
+        _rpc_manager = RpcMixin().rpc
+    return _rpc_manager
+
+
+@lru_cache(maxsize=256)
+def _columns(data_model) -> dict:
+    """ Mapped columns of a model by attribute name """
+    return dict(inspect(data_model).columns.items())
+
+
+@lru_cache(maxsize=256)
+def _relationships(data_model) -> dict:
+    """ Relationship attributes of a model by name """
+    return {key: rel.class_attribute for key, rel in inspect(data_model).relationships.items()}
+
+
+def _column(data_model, key: str):
+    try:
+        return _columns(data_model)[key]
+    except KeyError:
+        ...
+    # not a plain column, e.g. a hybrid property
+    column = getattr(data_model, key, None)
+    if column is None or key.startswith('_'):
+        log.warning(f'unknown field {key} for {data_model}')
+        abort(400, message=f'Unknown field: {key}')
+    return column
+
+
+def _build_filter_clauses(data_model, mode: str, project_id: Optional[int], filter_items: tuple) -> tuple:
+    filter_ = []
+    try:
+        filter_.append(data_model.mode == mode)
+    except AttributeError:
+        ...
+
+    if project_id is not None:
+        filter_.append(data_model.project_id == project_id)
+
+    filter_ += [_column(data_model, key) == value for key, value in filter_items]
+    return tuple(filter_)
+
+
+def _filter_items(raw_filter: Optional[str]) -> tuple:
+    """ Parsed args['filter'] as (key, value) pairs, decoded once per request """
+    if not raw_filter:
+        return ()
+    if not has_request_context():
+        return tuple(loads(raw_filter).items())
+    parsed = g.setdefault('_shared_parsed_filters', {})
+    try:
+        return parsed[raw_filter]
+    except KeyError:
+        items = parsed[raw_filter] = tuple(loads(raw_filter).items())
+        return items
+
+
+def _constrains_project(clauses: Optional[list], data_model, project_id: Optional[int]) -> bool:
+    """ Whether one of the server side clauses already is data_model.project_id == project_id """
+    if not clauses or project_id is None:
+        return False
+    column = _columns(data_model).get('project_id')
+    if column is None:
+        return False
+    return any(
+        isinstance(clause, BinaryExpression)
+        and clause.operator is operator.eq
+        and isinstance(clause.right, BindParameter)
+        and clause.right.value == project_id
+        and clause.left.compare(column)
+        for clause in clauses
+    )
+
+
+def _prepare_filter_clauses(
+        project_id: Optional[int], args: dict, data_model,
+        additional_filters: Optional[list] = None,
+        rpc_manager: Optional[Callable] = None,
+        mode: str = c.DEFAULT_MODE
+        ) -> tuple:
+    project_id_ = None
+    if mode == 'default' and not _constrains_project(additional_filters, data_model, project_id):
+        project_id_ = _project_id(project_id, rpc_manager or _default_rpc_manager())
+
+    filter_items = _filter_items(args.get('filter'))
+    filter_ = _build_filter_clauses(data_model, mode, project_id_, filter_items)
+
+    return (*filter_, *(additional_filters or ()))
+
+
 def prepare_filter(
         project_id: Optional[int], args: dict, data_model,
         additional_filters: Optional[list] = None,
         rpc_manager: Optional[Callable] = None,
         mode: str = c.DEFAULT_MODE
         ) -> SQLColumnExpression:
-    filter_ = []
+    clauses = _prepare_filter_clauses(project_id, args, data_model, additional_filters, rpc_manager, mode)
+    if len(clauses) == 1:
+        return clauses[0]
+    return and_(*clauses)
+
+
+def _cursor_value(column, value):
+    """ Value from an after cursor as the column's python type, JSON only brings back str and numbers """
+    if value is None:
+        return None
     try:
-        filter_.append(operator.eq(data_model.mode, mode))
-    except AttributeError:
-        ...
+        python_type = column.type.python_type
+    except (AttributeError, NotImplementedError):
+        return value
+    if isinstance(value, python_type):
+        return value
+    if python_type is bool:
+        abort(400, message='Invalid after cursor')
+    # dates and times come back as the str() next_page_after wrote them with
+    parse = getattr(python_type, 'fromisoformat', python_type)
+    try:
+        return parse(value)
+    except (TypeError, ValueError, ArithmeticError):
+        abort(400, message='Invalid after cursor')
+
+
+def _is_cursor_id(value) -> bool:
+    return isinstance(value, (int, str)) and not isinstance(value, bool)
+
+
+def _after_clause(data_model, sort_column, order: str, after: str):
+    """ Keyset condition for the rows following an after cursor, see next_page_after """
+    try:
+        cursor = loads(after)
+    except ValueError:
+        abort(400, message='Invalid after cursor')
+    id_column = _column(data_model, 'id')
+    descending = order == 'desc'
+
+    def past(column, value):
+        return column < value if descending else column > value
+
+    if sort_column is None or sort_column is id_column:
+        if not _is_cursor_id(cursor):
+            abort(400, message='Invalid after cursor')
+        return past(id_column, _cursor_value(id_column, cursor))
+    if not isinstance(cursor, list) or len(cursor) != 2 \
+            or not _is_cursor_id(cursor[1]) or isinstance(cursor[0], (list, dict)):
+        abort(400, message='Invalid after cursor')
+    value, id_ = _cursor_value(sort_column, cursor[0]), _cursor_value(id_column, cursor[1])
+    # NULLs sort as the largest value, see _sort_rule
+    if value is None:
+        if descending:
+            return or_(sort_column.is_not(None), and_(sort_column.is_(None), past(id_column, id_)))
+        return and_(sort_column.is_(None), past(id_column, id_))
+    clause = or_(past(sort_column, value), and_(sort_column == value, past(id_column, id_)))
+    if not descending and _nullable(sort_column):
+        return or_(clause, sort_column.is_(None))
+    return clause
+
+
+def _nullable(column) -> bool:
+    # hybrid properties and other expressions may be NULL as well
+    return getattr(column, 'nullable', True)
+
+
+def _sort_rule(sort_column, order: str):
+    """ ORDER BY for sort_column, NULLs placed as the largest value on every DB as keyset cursors expect """
+    rule = getattr(sort_column, order)()
+    if not _nullable(sort_column):
+        return rule
+    return rule.nulls_first() if order == 'desc' else rule.nulls_last()
+
+
+def next_page_after(rows: list, args: dict) -> Optional[str]:
+    """ after cursor pointing past the last of rows, None for an empty page """
+    if not rows:
+        return None
+    last = rows[-1]
+    if args.get('sort') and args['sort'] != 'id':
+        return dumps([getattr(last, args['sort']), last.id], default=str)
+    return dumps(last.id)
+
+
+def _paginate(session, stmt, order_by_: tuple, options_: list, limit_, offset_,
+              after_clause=None) -> Tuple[int, list]:
+    """ Fetch one page together with the total via count(*) over () """
+    unlimited = limit_ in ('All', 0, None)
+    if after_clause is not None:
+        # keyset page: the cursor replaces OFFSET, so the total needs its own count
+        page = stmt.where(after_clause).options(*options_).order_by(*order_by_)
+        res = session.execute(
+            page.limit(None if unlimited else limit_)
+        ).unique().scalars().all()
+        return _count(session, stmt), res
+
+    page = stmt.options(*options_).order_by(*order_by_)
+    if unlimited and not offset_:
+        res = session.execute(page).unique().scalars().all()
+        return len(res), res
+
+    rows = session.execute(
+        page.add_columns(
+            func.count().over()
+        ).limit(
+            None if unlimited else limit_
+        ).offset(
+            offset_
+        )
+    ).unique().all()
+    if rows:
+        return rows[0][1], [row[0] for row in rows]
+    # page past the end, the window has no rows to report the total on
+    return _count(session, stmt), []
 
-    if mode == 'default':
-        if not rpc_manager:
-            rpc_manager = RpcMixin().rpc
-        project = rpc_manager.call.project_get_or_404(project_id=project_id)
-        filter_.append(operator.eq(data_model.project_id, project.id))
 
-    if additional_filters:
-        filter_.extend(additional_filters)
-        # for key, value in additional_filter.items():
-        #     filter_.append(operator.eq(getattr(data_model, key), value))
+_LOADERS = {'joined': joinedload, 'selectin': selectinload}
 
-    if args.get('filter'):
-        for key, value in loads(args.get('filter')).items():
-            filter_.append(operator.eq(getattr(data_model, key), value))
 
-    filter_ = and_(*filter_)
-    return filter_
+def _loader_option(data_model, item):
+    """ Eager load option for a joinedload_ entry: attribute or name, optionally as (attr, strategy) """
+    strategy = None
+    if isinstance(item, tuple):
+        item, strategy = item
+    if isinstance(item, str):
+        item = _relationships(data_model)[item]
+    if strategy is None:
+        # collections get their own IN query instead of multiplying the parent rows,
+        # which is also the only eager load of collections that works with yield_per
+        strategy = 'selectin' if getattr(item.property, 'uselist', False) else 'joined'
+    return _LOADERS[strategy](item)
+
+
+def _count(session, stmt) -> int:
+    return session.execute(select(func.count()).select_from(stmt.subquery())).scalar_one()
+
+
+def _iter_all(project_id: Optional[int], page, yield_per: int, is_project_schema: bool) -> Iterator:
+    """ Stream every row of page in batches of yield_per """
+    page = page.execution_options(yield_per=yield_per)
+    if is_project_schema:
+        with with_project_schema_session(project_id) as session:
+            yield from session.execute(page).scalars()
+    else:
+        yield from db_session.execute(page).scalars()
 
 
 def get(project_id: Optional[int], args: dict, data_model,
@@ -70,68 +321,148 @@ def get(project_id: Optional[int], args: dict, data_model,
         mode: str = 'default',
         custom_filter: Optional[SQLColumnExpression] = None,
         joinedload_: Optional[list] = None,
-        is_project_schema: bool = False
-        ) -> Tuple[int, list]:
-    def _calculate_limit(limit: Union[str, int], total: int):
-        return total if limit == 'All' or limit == 0 else limit
-
+        is_project_schema: bool = False,
+        yield_per: Optional[int] = None,
+        strict_loading: Optional[bool] = None
+        ) -> Tuple[int, Union[list, Iterator]]:
+    """
+    Total and rows for a list endpoint.
+    joinedload_ relationships are joined for scalars and selectin loaded for
+    collections, unless given as (relationship, 'joined' | 'selectin').
+    With yield_per set, unlimited listings return an iterator over the rows
+    that fetches them in batches of that size instead of loading them all.
+    An after cursor from next_page_after is used instead of offset when given.
+    strict_loading (default: LOCAL_DEV) makes any relationship not in joinedload_
+    raise on access instead of lazy loading it row by row with a query
+    """
     limit_ = args.get("limit")
     offset_ = args.get("offset")
+    after_ = args.get("after")
     if args.get("sort"):
-        sort_rule = getattr(getattr(data_model, args["sort"]), args["order"])()
+        sort_column, order_ = _column(data_model, args["sort"]), args["order"]
+        sort_rule = _sort_rule(sort_column, order_)
     else:
+        sort_column, order_ = None, 'desc'
         sort_rule = data_model.id.desc()
 
+    order_by_ = (sort_rule,)
+    if sort_column is not None and sort_column is not _column(data_model, 'id'):
+        # ties on the sort column are broken by id, same as in the cursor,
+        # so the page a cursor came from and the next one agree on the order
+        order_by_ = (sort_rule, getattr(data_model.id, order_)())
+    after_clause = None
+    if after_:
+        offset_ = None
+        after_clause = _after_clause(data_model, sort_column, order_, after_)
+
+    # no clauses -> no WHERE at all instead of an empty and_()
     if custom_filter is None:
-        filter_ = prepare_filter(project_id, args, data_model, additional_filters, rpc_manager, mode)
+        filter_ = _prepare_filter_clauses(project_id, args, data_model, additional_filters, rpc_manager, mode)
     else:
-        filter_ = custom_filter
+        filter_ = (custom_filter,)
 
+    stream = yield_per and limit_ in ('All', 0, None) and not offset_ and not after_
     if joinedload_:
-        options_ = [joinedload(col) for col in joinedload_]
+        options_ = [_loader_option(data_model, item) for item in joinedload_]
     else:
         options_ = []
+    if c.LOCAL_DEV if strict_loading is None else strict_loading:
+        # loads the identity map can answer without a query are no N+1, let those through
+        options_.append(raiseload('*', sql_only=True))
+
+    stmt = select(data_model).where(*filter_)
+    if stream:
+        if is_project_schema:
+            with with_project_schema_session(project_id) as session:
+                total = _count(session, stmt)
+        else:
+            total = _count(db_session, stmt)
+        page = stmt.options(*options_).order_by(*order_by_)
+        return total, _iter_all(project_id, page, yield_per, is_project_schema)
 
     if is_project_schema:
         with with_project_schema_session(project_id) as session:
-            total = session.query(data_model).order_by(sort_rule).filter(filter_).count()
-            res = session.query(data_model).filter(
-                filter_
-            ).options(
-                *options_
-            ).order_by(
-                sort_rule
-            ).limit(
-                _calculate_limit(limit_, total)
-            ).offset(
-                offset_
-            ).all()
-
-        return total, res
-
-    total = data_model.query.order_by(sort_rule).filter(filter_).count()
-    res = data_model.query.filter(
-        filter_
-    ).options(
-        *options_
-    ).order_by(
-        sort_rule
-    ).limit(
-        _calculate_limit(limit_, total)
-    ).offset(
-        offset_
-    ).all()
-
-    return total, res
-
-
-def upload_file_base(bucket: str, data: bytes, file_name: str, client, create_if_not_exists: bool = True) -> None:
+            return _paginate(session, stmt, order_by_, options_, limit_, offset_, after_clause)
+
+    return _paginate(db_session, stmt, order_by_, options_, limit_, offset_, after_clause)
+
+
+STREAM_UPLOAD_MIN_SIZE = 1024 * 1024  # bytes, smaller uploads are simply read into memory
+
+
+def _stream_length(f) -> Optional[int]:
+    """ Bytes left in a werkzeug FileStorage stream, None if it can not be streamed """
+    stream = getattr(f, 'stream', None)
+    # SpooledTemporaryFile, used by werkzeug for large uploads, has no seekable() before 3.11
+    seekable = getattr(stream, 'seekable', None)
+    if seekable is None:
+        return None
+    try:
+        if not seekable():
+            return None
+        position = stream.tell()
+        length = stream.seek(0, os.SEEK_END) - position
+        stream.seek(position)
+    except (AttributeError, OSError, ValueError):
+        return None
+    return length
+
+
+def _ensure_bucket(bucket: str, client) -> None:
+    # storage engines answer any unknown attribute with None, hence callable()
+    bucket_exists = getattr(client, 'bucket_exists', None)
+    if callable(bucket_exists):
+        exists = bucket_exists(bucket)
+    else:
+        exists = bucket in client.list_bucket()
+    if not exists:
+        bucket_type = 'system' if bucket in ('tasks', 'tests') else 'local'
+        client.create_bucket(bucket=bucket, bucket_type=bucket_type)
+
+
+def upload_file_base(bucket: str, data: Union[bytes, BinaryIO], file_name: str, client,
+                     create_if_not_exists: bool = True, length: Optional[int] = None) -> None:
     # avoid using this, try MinioClient instead
     if create_if_not_exists:
-        if bucket not in client.list_bucket():
-            bucket_type = 'system' if bucket in ('tasks', 'tests') else 'local'
-            client.create_bucket(bucket=bucket, bucket_type=bucket_type)
-    client.upload_file(bucket, data, file_name)
+        _ensure_bucket(bucket, client)
+    # storage engines answer any unknown attribute with None, hence callable()
+    put_object_stream = getattr(client, 'put_object_stream', None)
+    if length is not None and not isinstance(data, bytes) and callable(put_object_stream):
+        put_object_stream(bucket, file_name, data, length)
+    else:
+        if not isinstance(data, (bytes, str)):
+            # storage engines read it all anyway, and need bytes to account the size correctly
+            data = data.read()
+        client.upload_file(bucket, data, file_name)
+
+
+def upload_file_stream(bucket: str, fileobj: BinaryIO, file_name: str, client,
+                       create_if_not_exists: bool = True, length: Optional[int] = None) -> None:
+    # avoid using this, try MinioClient instead
+    upload_file_base(bucket, fileobj, file_name, client, create_if_not_exists, length)
+
+
+def _upload(bucket: str, f, client, create_if_not_exists: bool) -> None:
+    length = None
+    # only MinioClient can stream, see upload_file_base
+    if callable(getattr(client, 'put_object_stream', None)):
+        length = _stream_length(f)
+    if length is not None and length >= STREAM_UPLOAD_MIN_SIZE:
+        data = f.stream
+    else:
+        data, length = f.read(), None
+    upload_file_base(
+        bucket=bucket,
+        data=data,
+        file_name=f.filename,
+        client=client,
+        create_if_not_exists=create_if_not_exists,
+        length=length
+    )
+    try:
+        f.remove()
+    except:
+        pass
 
 
 def upload_file(bucket: str,
@@ -151,17 +482,7 @@ def upload_file(bucket: str,
                          integration_id=integration_id,
                          is_local=is_local)
 
-    upload_file_base(
-        bucket=bucket,
-        data=f.read(),
-        file_name=f.filename,
-        client=mc,
-        create_if_not_exists=create_if_not_exists
-    )
-    try:
-        f.remove()
-    except:
-        pass
+    _upload(bucket, f, mc, create_if_not_exists)
 
 
 def upload_file_admin(bucket: str,
@@ -170,17 +491,7 @@ def upload_file_admin(bucket: str,
                       create_if_not_exists: bool = True,
                       **kwargs) -> None:
     # avoid using this, try MinioClient instead
-    upload_file_base(
-        bucket=bucket,
-        data=f.read(),
-        file_name=f.filename,
-        client=MinioClientAdmin(integration_id),
-        create_if_not_exists=create_if_not_exists
-    )
-    try:
-        f.remove()
-    except:
-        pass
+    _upload(bucket, f, MinioClientAdmin(integration_id), create_if_not_exists)
 
 
 class APIBase(Resource):
@@ -188,7 +499,7 @@ class APIBase(Resource):
     url_params = list()
 
     def proxy_method(self, method: str, mode: str = 'default', **kwargs):
-        log.info(
+        log.debug(
             'Calling proxy method: [%s] mode: [%s] | %s',
             method, mode, kwargs
         )
@@ -196,15 +507,15 @@ class APIBase(Resource):
         if not handler:
             log.warning(f'api handler not found for mode: {mode}')
             abort(404)
-        method = getattr(handler(self, mode), method)
-        if not method:
+        if not getattr(handler, method, None):
             log.warning(f'api method not found for handler: {handler} in mode: {mode}')
             abort(404)
-        return method(**kwargs)
+        # looked up on the instance, so static and class methods bind as before
+        return getattr(handler(self, mode), method)(**kwargs)
 
     def __init__(self, module):
         self.module = module
-        log.info('APIBase init %s | %s', self.mode_handlers, self.url_params)
+        log.debug('APIBase init %s | %s', self.mode_handlers, self.url_params)
 
     def get(self, **kwargs):
         return self.proxy_method('get', **kwargs)
@@ -223,94 +534,154 @@ class APIBase(Resource):
 
 
 class APIModeHandler:
+    __slots__ = ('_api', 'mode', 'module')
+
     def __init__(self, api: Resource, mode: str = 'default'):
         self._api = api
         self.mode = mode
+        # the most used attribute of api, kept here to skip __getattr__
+        self.module = api.module
 
     def __getattr__(self, item):
-        try:
-            return self.__dict__[item]
-        except KeyError:
-            if item in ['get', 'post', 'put', 'delete', 'head', 'options', 'patch']:
-                return None
-            return getattr(self._api, item)
+        # only called after regular (slot and __dict__) lookup has failed
+        if item in APIModeHandler.__slots__:
+            raise AttributeError(item)
+        if item in _HTTP_METHODS:
+            return None
+        return getattr(self._api, item)
 
 
 import urllib.parse
 
 
+@lru_cache(maxsize=4096)
 def build_api_url(
         plugin: str, file_name: str, mode: str = 'default',
         api_version: int = 1, trailing_slash: bool = False,
         skip_mode: bool = False
 ) -> str:
-    struct = ['/api', f'v{api_version}', plugin, urllib.parse.quote(file_name)]
-    if not skip_mode:
-        struct.append(mode)
-    url = '/'.join(map(str, struct))
-    if trailing_slash:
-        url += '/'
-    return url
+    quoted_name = urllib.parse.quote(file_name)
+    if skip_mode:
+        url = f'/api/v{api_version}/{plugin}/{quoted_name}'
+    else:
+        url = f'/api/v{api_version}/{plugin}/{quoted_name}/{mode}'
+    return url + '/' if trailing_slash else url
+
+
+# metrics are sent off the response path, see endpoint_metrics
+_metrics_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='shared_metrics')
+# events queued or being sent, past that new ones are dropped instead of piling up with their bodies
+_metrics_backlog = BoundedSemaphore(c.ENDPOINT_METRICS_BACKLOG)
+
+
+def shutdown_metrics() -> None:
+    """ Stop the metrics executor, events not sent yet are dropped """
+    _metrics_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit_metrics(event_manager, payload: dict) -> None:
+    if not _metrics_backlog.acquire(blocking=False):
+        log.warning('endpoint_metrics backlog is full, event dropped')
+        return
+    try:
+        future = _metrics_executor.submit(_fire_metrics, event_manager, payload)
+    except RuntimeError:
+        # shut down with the module
+        _metrics_backlog.release()
+        return
+    future.add_done_callback(lambda _: _metrics_backlog.release())
+
+
+def _fire_metrics(event_manager, payload: dict) -> None:
+    try:
+        event_manager.fire_event('usage_api_monitor', payload)
+    except Exception as e:
+        log.warning(f'endpoint_metrics fire_event failed: {e}')
+
+
+METRICS_BODY_LIMIT = 1024 * 1024  # bytes, larger request bodies are not sent with metrics
+METRICS_RESPONSE_LIMIT = 64 * 1024  # bytes, larger captured responses are replaced by their size
+
+
+def _metrics_payload(kwargs: dict, date_: datetime) -> dict:
+    from tools import auth
+    req_body = dict()
+    if request.content_type == 'application/json' and (request.content_length or 0) <= METRICS_BODY_LIMIT:
+        # already parsed and cached by flask, referenced as is
+        json_body = request.get_json(silent=True)
+        if isinstance(json_body, dict):
+            req_body = json_body
+        elif json_body:
+            log.warning(f'endpoint_metrics body issue {type(json_body)}')
+    payload = {
+        'project_id': request.view_args.get('project_id', kwargs.get('project_id')),
+        'mode': request.view_args.get('mode', kwargs.get('mode')),
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'user': auth.current_user().get("id"),
+        'display_name': request.headers.get('X-CARRIER-UID'),
+        'date': date_,
+        'view_args': request.view_args,
+        'query_params': request.args.to_dict(),
+        'json': req_body
+    }
+    if request.files:
+        payload['files'] = {k: secure_filename(v.filename) for k, v in request.files.items(multi=False)}
+    return payload
 
 
 def endpoint_metrics(function):
+    if not c.ENDPOINT_METRICS_ENABLED:
+        return function
+
     @wraps(function)
     def wrapper(*args, **kwargs):
-        from tools import auth, rpc_tools
         start_time, date_ = time.perf_counter(), datetime.now()
-        req_body = dict()
-        if request.content_type == 'application/json':
-            if request.json:
-                try:
-                    req_body = dict(request.json)
-                except Exception as e:
-                    log.warning(f'endpoint_metrics body issue {req_body}')
-        payload = {
-            'project_id': request.view_args.get('project_id', kwargs.get('project_id')),
-            'mode': request.view_args.get('mode', kwargs.get('mode')),
-            'endpoint': request.endpoint,
-            'method': request.method,
-            'user': auth.current_user().get("id"),
-            'display_name': request.headers.get('X-CARRIER-UID'),
-            'date': date_,
-            'view_args': request.view_args,
-            'query_params': request.args.to_dict(),
-            'json': req_body
-        }
-        if request.files:
-            payload['files'] = {k: secure_filename(v.filename) for k, v in request.files.to_dict().items()}
-        def modified_function(*args, **kwargs):
-            @after_this_request
-            def send_metrics(response):
-                payload['run_time'] = time.perf_counter() - start_time
-                payload['status_code'] = response.status_code
+
+        @after_this_request
+        def send_metrics(response):
+            from tools import rpc_tools
+            # the request is still active here, no need to snapshot it before the call
+            payload = _metrics_payload(kwargs, date_)
+            payload['run_time'] = time.perf_counter() - start_time
+            payload['status_code'] = response.status_code
+            payload['response_size'] = response.calculate_content_length()
+            payload['response_content_type'] = response.content_type
+            payload['response'] = None
+            if c.ENDPOINT_METRICS_CAPTURE_RESPONSE:
                 try:
-                    payload['response'] = response.get_data(as_text=True)
+                    raw = response.get_data()
+                    if len(raw) <= METRICS_RESPONSE_LIMIT:
+                        payload['response'] = raw.decode('utf-8', errors='replace')
+                    else:
+                        payload['response'] = f'<truncated {len(raw)} bytes>'
                 except RuntimeError as e:
                     log.warning(f'send_metrics response.get_data raised {e}')
-                    payload['response'] = None
-                rpc_tools.EventManagerMixin().event_manager.fire_event('usage_api_monitor', payload)
-                return response
-            return function(*args, **kwargs)
-        response = modified_function(*args, **kwargs)
-        return response
+            _submit_metrics(rpc_tools.EventManagerMixin().event_manager, payload)
+            return response
+
+        return function(*args, **kwargs)
     return wrapper
 
 
 def with_modes(url_params: list[str]) -> list:
-    params = set()
+    # dict keeps the registration order stable while dropping duplicates
+    params = dict()
     for i in url_params:
         if not i.startswith('<string:mode>'):
-            if i == '':
-                params.add('<string:mode>')
-            else:
-                params.add(f'<string:mode>/{i}')
-        params.add(i)
+            params[f'<string:mode>/{i}' if i else '<string:mode>'] = None
+        params[i] = None
     return list(params)
 
 
 def normalize_url(url: str):
-    parsed_url = urlparse(str(url))
+    # str() first: callers also pass url objects, the cache is keyed by the plain string
+    return _normalize_url(str(url))
+
+
+@lru_cache(maxsize=8192)
+def _normalize_url(url: str) -> str:
+    parsed_url = urlparse(url)
     normalized_url = urlunparse(
         ParseResult(
             scheme=parsed_url.scheme.lower(),
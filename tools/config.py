@@ -17,10 +17,49 @@
 """ Config """
 
 import json
+from types import MappingProxyType
+
 from pylon.core.tools import log  # pylint: disable=E0401
 from ..patterns import SingletonABC
 
 
+_TRUE_STRINGS = frozenset(("true", "yes"))
+
+_PROCESSORS = {
+    "str": lambda item: item if isinstance(item, str) else str(item),
+    "int": lambda item: item if isinstance(item, int) else int(item),
+    "bool": lambda item: item if isinstance(item, bool) else item.lower() in _TRUE_STRINGS,
+    "dict": lambda item: item if isinstance(item, dict) else json.loads(item),
+}
+
+
+def _sqlite_database(config, options):
+    """ URI and engine options for sqlite, probably is not supported with tenant schemas now """
+    options["isolation_level"] = "SERIALIZABLE"
+    return f"sqlite:///{config.SQLITE_DB}", options
+
+
+def _postgres_database(config, options):
+    """ URI and engine options for postgres """
+    uri = f"postgresql://{config.POSTGRES_USER}:{config.POSTGRES_PASSWORD}" \
+          f"@{config.POSTGRES_HOST}:{config.POSTGRES_PORT}/{config.POSTGRES_DB}"
+    if not options:
+        options = {
+            "isolation_level": "READ COMMITTED",
+            "echo": False,
+            "pool_size": 25,
+            "max_overflow": 25,
+            "pool_pre_ping": True
+        }
+    return uri, options
+
+
+_DATABASE_VENDORS = {
+    "sqlite": _sqlite_database,
+    "postgres": _postgres_database,
+}
+
+
 class Config(metaclass=SingletonABC):  # pylint: disable=R0903
     """ Config singleton """
 
@@ -140,49 +179,48 @@ class Config(metaclass=SingletonABC):  # pylint: disable=R0903
                 ("STORAGE_LIBCLOUD_DRIVER", "str", "LOCAL"),
                 ("STORAGE_LIBCLOUD_PARAMS", "any", {"kwargs": {"key": "/tmp/storage"}}),
                 ("STORAGE_LIBCLOUD_ENCODER", "str", None),
+                # Used in tools/minio_client.py for large streamed uploads
+                ("STORAGE_MULTIPART_THRESHOLD", "int", 64 * 1024 * 1024),
+                ("STORAGE_MULTIPART_PART_SIZE", "int", 16 * 1024 * 1024),
+                ("STORAGE_UPLOAD_CONCURRENCY", "int", 8),
                 ("NO_GROUP_NAME", "str", 'no-group'),
+                # Used in module.py · size of the RPC pool shared by API handlers
+                ("SHARED_RPC_WORKERS", "int", 32),
+                # Used in tools/api_tools.py · endpoint_metrics
+                # Disabled -> endpoints decorated with it are left as is
+                ("ENDPOINT_METRICS_ENABLED", "bool", True),
+                # Send full response bodies with usage_api_monitor events, not only their size
+                ("ENDPOINT_METRICS_CAPTURE_RESPONSE", "bool", False),
+                # Events waiting to be sent, more are dropped while fire_event falls behind
+                ("ENDPOINT_METRICS_BACKLOG", "int", 1000),
             )
         )
         #
         # Make DB URI if not set
         #
-        if self.DATABASE_ENGINE_OPTIONS is None:
-            self.DATABASE_ENGINE_OPTIONS = {}
+        options = dict(self.DATABASE_ENGINE_OPTIONS or {})
         #
         if self.DATABASE_URI is None:
-            if self.DATABASE_VENDOR == "sqlite":  # Probably is not supported with tenant schemas now  # pylint: disable=C0301
-                self.DATABASE_URI = f"sqlite:///{self.SQLITE_DB}"
-                self.DATABASE_ENGINE_OPTIONS["isolation_level"] = "SERIALIZABLE"
-            elif self.DATABASE_VENDOR == "postgres":
-                self.DATABASE_URI = 'postgresql://{username}:{password}@{host}:{port}/{database}'.format(  # pylint: disable=C0301
-                    host=self.POSTGRES_HOST,
-                    port=self.POSTGRES_PORT,
-                    username=self.POSTGRES_USER,
-                    password=self.POSTGRES_PASSWORD,
-                    database=self.POSTGRES_DB
-                )
-                if not self.DATABASE_ENGINE_OPTIONS:
-                    self.DATABASE_ENGINE_OPTIONS = {
-                        "isolation_level": "READ COMMITTED",
-                        "echo": False,
-                        "pool_size": 25,
-                        "max_overflow": 25,
-                        "pool_pre_ping": True
-                    }
-            else:
+            if self.DATABASE_VENDOR not in _DATABASE_VENDORS:
                 raise RuntimeError(f"Unsupported DB vendor: {self.DATABASE_VENDOR}")
+            #
+            self.DATABASE_URI, options = _DATABASE_VENDORS[self.DATABASE_VENDOR](self, options)
+        #
+        # Room for the many filter/sort/loader variants of list queries in the compiled cache.
+        # Only engines built from these options pick it up: the one tools/db.py injects
+        # (FORCE_INJECT_DB or the default sqlite:// pylon DB) and other plugins' own engines.
+        # The pylon-made context.db.engine keeps its own settings
+        #
+        options.setdefault("query_cache_size", 5000)
+        #
+        # Read-only: engines are created from it, changes later on would not apply anyway
+        #
+        self.DATABASE_ENGINE_OPTIONS = MappingProxyType(options)
         #
         log.info('Initialized config %s', self)
 
     def load_settings(self, settings, schema):
         """ Load and set config vars """
-        processors = {
-            "str": lambda item: item if isinstance(item, str) else str(item),
-            "int": lambda item: item if isinstance(item, int) else int(item),
-            "bool": lambda item: item if isinstance(item, bool) else item.lower() in ["true", "yes"],  # pylint: disable=C0301
-            "dict": lambda item: item if isinstance(item, dict) else json.loads(item),
-        }
-        #
         for item in schema:
             if len(item) == 3:
                 key, kind, default = item
@@ -195,17 +233,15 @@ class Config(metaclass=SingletonABC):  # pylint: disable=R0903
             if isinstance(default, set):
                 default = getattr(self, list(default)[0])
             #
-            data = ...
-            for variant in [key, key.lower(), key.upper()]:
-                if variant in settings:
-                    data = settings[variant]
+            # same precedence as before: KEY over key over the schema spelling
+            data = settings.get(key.upper(), settings.get(key.lower(), settings.get(key, ...)))
             #
             if data is ... and default is ...:
                 raise RuntimeError(f"Required config value is not set: {key}")
             #
             if data is ...:
                 data = default
-            elif kind in processors:
-                data = processors[kind](data)
+            elif kind in _PROCESSORS:
+                data = _PROCESSORS[kind](data)
             #
             setattr(self, key, data)
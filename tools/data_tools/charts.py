@@ -1,6 +1,12 @@
 import random
 from typing import List, Generator
 
+try:
+    import numpy as np
+    _rng = np.random.default_rng()
+except ImportError:
+    np = None
+
 
 def color_gen(n: int, max_step: int = 51) -> Generator:
     if n <= 0:
@@ -19,6 +25,41 @@ def color_gen(n: int, max_step: int = 51) -> Generator:
             yield tuple(color)
 
 
+def _color_walk_np(n: int, max_step: int, shuffle: bool = False) -> List[tuple]:
+    """ Same random walk as color_gen, generated in one go with numpy """
+    # two picks per step like in color_gen, add.at moves a channel picked twice twice
+    indexes_to_change = _rng.integers(0, 3, size=(n, 2))
+    steps = np.zeros((n, 3), dtype=np.int64)
+    np.add.at(steps, (np.arange(n)[:, None], indexes_to_change), max_step)
+    colors = (_rng.integers(0, 256, size=3) + steps.cumsum(axis=0)) % 256
+    if shuffle:
+        _rng.shuffle(colors)
+    return list(map(tuple, colors.tolist()))
+
+
+_COLOR_SPACE = 256 ** 3
+
+
+def _distinct_colors_np(n: int) -> List[tuple]:
+    """ strict get_colors with numpy: distinct random colors, repeats only once all 256 ** 3 are used """
+    distinct = min(n, _COLOR_SPACE)
+    if distinct > _COLOR_SPACE // 2:
+        # rejection sampling would need many rounds for the last few colors
+        colors = _rng.permutation(_COLOR_SPACE)[:distinct]
+    else:
+        colors = np.unique(_rng.integers(0, _COLOR_SPACE, size=distinct + distinct // 5 + 8))
+        while colors.size < distinct:
+            more = _rng.integers(0, _COLOR_SPACE, size=2 * (distinct - colors.size))
+            colors = np.unique(np.concatenate((colors, more)))
+        # np.unique sorts, shuffle before cutting so small colors are not preferred
+        _rng.shuffle(colors)
+        colors = colors[:distinct]
+    if distinct < n:
+        colors = np.concatenate((colors, _rng.choice(colors, size=n - distinct)))
+    rgb = np.stack(((colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF), axis=1)
+    return list(map(tuple, rgb.tolist()))
+
+
 def get_colors(n: int, shuffle: bool = False, strict: bool = False, max_step: int = 51) -> List[tuple]:
     """
     returns list of colors with size of n
@@ -32,7 +73,9 @@ def get_colors(n: int, shuffle: bool = False, strict: bool = False, max_step: in
     """
     if n <= 0:
         return [(0, 0, 0)]
-    if strict:
+    if strict and np is not None:
+        result = _distinct_colors_np(n)
+    elif strict:
         result = set()
         max_attempts = 13
         attempts = max_attempts
@@ -46,7 +89,10 @@ def get_colors(n: int, shuffle: bool = False, strict: bool = False, max_step: in
         result = list(result)
         result.extend(random.choices(result, k=n - len(result)))
     else:
-        result = list(color_gen(n=n, max_step=max_step))
-        if shuffle:
-            random.shuffle(result)
+        if np is not None:
+            result = _color_walk_np(n, max_step, shuffle)
+        else:
+            result = list(color_gen(n=n, max_step=max_step))
+            if shuffle:
+                random.shuffle(result)
     return list(result)
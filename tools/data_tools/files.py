@@ -1,26 +1,72 @@
-from io import BytesIO
+from tempfile import SpooledTemporaryFile
 from typing import Optional
 
-from requests import get
+from requests import Session
+from requests.adapters import HTTPAdapter
 import os
 from uuid import uuid4
 
 from tools import config as c
 
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+FILE_SPOOL_MAX_SIZE = 8 * 1024 * 1024  # bytes, larger downloads spill over to a temporary file on disk
 
-class File(BytesIO):
+# shared between downloads so connections to the same hosts are reused
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64)
+
+
+def _get(url: str, **kwargs):
+    # a session per download, as with requests.get: sessions are not meant to be shared
+    # between threads and would carry cookies over from one download to the next.
+    # Not closed, that would close the shared adapter
+    session = Session()
+    session.mount("http://", _adapter)
+    session.mount("https://", _adapter)
+    return session.get(url, **kwargs)
+
+
+class File(SpooledTemporaryFile):
+    """
+    Downloaded file, kept in memory up to FILE_SPOOL_MAX_SIZE and on disk above it.
+
+    Of the BytesIO API it used to have it keeps the file methods plus getvalue()
+    and getbuffer(); getbuffer() is a read-only snapshot, not a live view.
+    Closing is up to the owner, the spilled temporary file goes away on close.
+    """
     def __init__(self, url: str, file_name: Optional[str] = None):
         self._url = url
         if file_name:
             self.filename = file_name
         else:
             self.filename = url.split("/")[-1]
-        super().__init__()
+        super().__init__(max_size=FILE_SPOOL_MAX_SIZE)
 
-        r = get(self._url, allow_redirects=True)
-        self.write(r.content)
+        with _get(self._url, allow_redirects=True, stream=True) as r:
+            # iter_content, unlike r.raw, also undoes gzip/deflate transfer encoding
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                self.write(chunk)
         self.seek(0)
 
+    @property
+    def stream(self):
+        # same as werkzeug FileStorage, lets upload_file stream large files instead of reading them
+        return self
+
+    def seekable(self) -> bool:
+        return True
+
+    def getvalue(self) -> bytes:
+        """ Whole content regardless of the position, as with the BytesIO File used to be """
+        position = self.tell()
+        self.seek(0)
+        try:
+            return self.read()
+        finally:
+            self.seek(position)
+
+    def getbuffer(self) -> memoryview:
+        return memoryview(self.getvalue())
+
 
 class FileOld:
     def __init__(self, url: str, file_name: Optional[str] = None):
@@ -35,7 +81,7 @@ class FileOld:
         if not self.path:
             # self.path = os.path.join(c.TASKS_UPLOAD_FOLDER, str(uuid4()))
             self.path = os.path.join(c.TASKS_UPLOAD_FOLDER, self.filename)
-            r = get(self.url, allow_redirects=True)
+            r = _get(self.url, allow_redirects=True)
             with open(self.path, 'wb') as f:
                 f.write(r.content)
                 return r.content
@@ -1,6 +1,7 @@
 import traceback
 
 from contextlib import closing
+from functools import lru_cache
 from flask_sqlalchemy import BaseQuery
 from sqlalchemy import create_engine, MetaData
 from sqlalchemy.schema import CreateSchema
@@ -12,20 +13,33 @@ from pylon.core.tools import db_support
 from tools import config as c, context
 
 
+# DB: local
+_project_schema_template = None
+
+
+# DB: local
+def get_project_schema_template():
+    """ PROJECT_SCHEMA_TEMPLATE, project_constants are only there once the projects plugin is loaded """
+    global _project_schema_template  # pylint: disable=W0603
+    if _project_schema_template is None:
+        from tools import project_constants as pc  # pylint: disable=E0401,C0415
+        _project_schema_template = pc["PROJECT_SCHEMA_TEMPLATE"]
+    return _project_schema_template
+
+
 # DB: local
 def schema_mapper(schema):
     if schema in [..., None, c.POSTGRES_SCHEMA]:
         return ...
     #
-    from tools import project_constants as pc  # pylint: disable=E0401,C0415
-    return pc["PROJECT_SCHEMA_TEMPLATE"].format(schema)
+    return get_project_schema_template().format(schema)
 
 
 # DB: local
 context.db.schema_mapper = schema_mapper
 
 
-# DB: transitional config injector
+# DB: transitional config injector, the only place DATABASE_ENGINE_OPTIONS reach context.db.engine
 if c.FORCE_INJECT_DB or context.db.url == "sqlite://":
     log.info("Injecting DB config")
     #
@@ -50,6 +64,17 @@ if c.FORCE_INJECT_DB or context.db.url == "sqlite://":
 engine = context.db.engine
 
 
+# DB: local dev, makes statements that miss the compiled query cache visible
+if c.LOCAL_DEV:
+    from sqlalchemy import event
+    from sqlalchemy.engine.default import CACHE_MISS
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def log_compiled_cache_miss(conn, cursor, statement, parameters, exec_context, executemany):  # pylint: disable=R0913,W0613
+        if getattr(exec_context, "cache_hit", None) is CACHE_MISS:
+            log.debug("Compiled cache miss: %s", statement)
+
+
 # DB: transitional for 'public' schemas on present deployments
 with engine.connect() as connection:
     connection.execute(CreateSchema(c.POSTGRES_SCHEMA, if_not_exists=True))
@@ -143,30 +168,70 @@ Base = declarative_base()
 Base.query = QueryProxy()
 
 
-# DB: used
-def get_all_metadata():
-    meta = MetaData()
-    for table in Base.metadata.tables.values():
-        table.tometadata(meta)
+def _build_metadata(tables, schema=None) -> MetaData:
+    meta = MetaData(schema=schema)
+    for table in tables:
+        table.to_metadata(meta)
     return meta
 
 
+# Plugins keep registering tables on Base after import, so the cached copies
+# are rebuilt when the registered table names change: _table_keys is only the
+# cache key, the builders read Base.metadata themselves.
+# The getters share one MetaData between callers, copy=True gives a private one to modify
+
+
+@lru_cache(maxsize=1)
+def _all_metadata(_table_keys: tuple) -> MetaData:
+    return _build_metadata(Base.metadata.tables.values())
+
+
+@lru_cache(maxsize=1)
+def _shared_metadata(_table_keys: tuple) -> MetaData:
+    return _build_metadata(
+        table for table in Base.metadata.tables.values()
+        if table.schema != c.POSTGRES_TENANT_SCHEMA
+    )
+
+
+@lru_cache(maxsize=1)
+def _tenant_specific_metadata(_table_keys: tuple) -> MetaData:
+    return _build_metadata(
+        (
+            table for table in Base.metadata.tables.values()
+            if table.schema == c.POSTGRES_TENANT_SCHEMA
+        ),
+        schema=c.POSTGRES_TENANT_SCHEMA
+    )
+
+
+# DB: public, for plugins redefining their tables under the same names (e.g. on reload)
+def invalidate_metadata_cache():
+    """ Drop cached metadata, the table names alone do not show a table was redefined """
+    _all_metadata.cache_clear()
+    _shared_metadata.cache_clear()
+    _tenant_specific_metadata.cache_clear()
+
+
 # DB: used
-def get_shared_metadata():
-    meta = MetaData()
-    for table in Base.metadata.tables.values():
-        if table.schema != c.POSTGRES_TENANT_SCHEMA:
-            table.tometadata(meta)
-    return meta
+def get_all_metadata(copy: bool = False):
+    """ MetaData with all tables, shared between callers unless copy is set: do not modify it """
+    build = _all_metadata.__wrapped__ if copy else _all_metadata
+    return build(tuple(Base.metadata.tables))
+
+
+# DB: used
+def get_shared_metadata(copy: bool = False):
+    """ MetaData with non-tenant tables, shared between callers unless copy is set: do not modify it """
+    build = _shared_metadata.__wrapped__ if copy else _shared_metadata
+    return build(tuple(Base.metadata.tables))
 
 
 # DB: used (by flows)
-def get_tenant_specific_metadata():
-    meta = MetaData(schema=c.POSTGRES_TENANT_SCHEMA)
-    for table in Base.metadata.tables.values():
-        if table.schema == c.POSTGRES_TENANT_SCHEMA:
-            table.tometadata(meta)
-    return meta
+def get_tenant_specific_metadata(copy: bool = False):
+    """ MetaData with tenant tables, shared between callers unless copy is set: do not modify it """
+    build = _tenant_specific_metadata.__wrapped__ if copy else _tenant_specific_metadata
+    return build(tuple(Base.metadata.tables))
 
 
 # DB: used
@@ -1,11 +1,12 @@
 from abc import abstractmethod, ABC
 from json import loads
 from queue import Empty
-from typing import Optional
+from typing import Optional, BinaryIO
 import sys
 import importlib
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config, ClientError
 from pylon.core.tools import log
 
@@ -75,6 +76,16 @@ class MinioClientABC(ABC, EventManagerMixin):
             if each["Name"].startswith(self.bucket_prefix)
         ]
 
+    def bucket_exists(self, bucket: str) -> bool:
+        try:
+            self.s3_client.head_bucket(Bucket=self.format_bucket_name(bucket))
+        except ClientError as e:
+            # HEAD responses carry no error body, only the status code
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchBucket'):
+                return False
+            raise
+        return True
+
     def create_bucket(self, bucket: str, bucket_type=None, retention_days: Optional[int] = None) -> Optional[dict]:
         try:
             bucket_name = self.format_bucket_name(bucket)
@@ -119,10 +130,44 @@ class MinioClientABC(ABC, EventManagerMixin):
     @space_monitor
     def upload_file(self, bucket: str, file_obj: bytes, file_name: str):
         response = self.s3_client.put_object(Key=file_name, Bucket=self.format_bucket_name(bucket), Body=file_obj)
-        throughput_monitor(client=self, file_size=sys.getsizeof(file_obj))
+        if isinstance(file_obj, (bytes, str)):
+            file_size = sys.getsizeof(file_obj)
+        else:
+            file_size = file_obj.tell()  # file-like body, read to the end by put_object
+        throughput_monitor(client=self, file_size=file_size)
         # self._space_monitor()
         return response
 
+    def put_object_stream(self, bucket: str, file_name: str, stream: BinaryIO, length: int):
+        """ Upload straight from a file-like object of known length """
+        return self._put_object_stream(bucket, stream, length, file_name)
+
+    @space_monitor
+    def _put_object_stream(self, bucket: str, stream: BinaryIO, length: int, file_name: str):
+        # file_name goes last, space_monitor takes it from args[-1]
+        if length > c.STORAGE_MULTIPART_THRESHOLD:
+            response = self.upload_file_multipart(bucket, file_name, stream)
+        else:
+            response = self.s3_client.put_object(
+                Key=file_name, Bucket=self.format_bucket_name(bucket),
+                Body=stream, ContentLength=length
+            )
+        throughput_monitor(client=self, file_size=length)
+        return response
+
+    def upload_file_multipart(self, bucket: str, file_name: str, stream: BinaryIO,
+                              part_size: int = c.STORAGE_MULTIPART_PART_SIZE,
+                              concurrency: int = c.STORAGE_UPLOAD_CONCURRENCY) -> None:
+        """ Multipart upload with parts sent in parallel, does no usage monitoring by itself """
+        self.s3_client.upload_fileobj(
+            stream, self.format_bucket_name(bucket), file_name,
+            Config=TransferConfig(
+                multipart_threshold=part_size,
+                multipart_chunksize=part_size,
+                max_concurrency=concurrency
+            )
+        )
+
     def download_file(self, bucket: str, file_name: str, project_id: int = None) -> bytes:
         response = self.s3_client.get_object(Bucket=self.format_bucket_name(bucket), Key=file_name)
         throughput_monitor(client=self, file_size=response['ContentLength'], project_id=project_id)
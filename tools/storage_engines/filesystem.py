@@ -117,6 +117,10 @@ class EngineBase(metaclass=EngineMeta):
         #
         return result
 
+    def bucket_exists(self, bucket):
+        bucket_name = self.format_bucket_name(bucket)
+        return os.path.isdir(os.path.join(self.bucket_path, self._fs_encode_name(bucket_name)))
+
     def create_bucket(self, bucket, bucket_type=None, retention_days=None):
         bucket_name = self.format_bucket_name(bucket)
         path = os.path.join(self.bucket_path, self._fs_encode_name(bucket_name))
@@ -23,7 +23,7 @@ import time
 import base64
 import datetime
 
-from libcloud.storage.types import Provider  # pylint: disable=E0401
+from libcloud.storage.types import Provider, ContainerDoesNotExistError  # pylint: disable=E0401
 from libcloud.storage.providers import get_driver  # pylint: disable=E0401
 
 from pylon.core.tools import log  # pylint: disable=E0401
@@ -132,6 +132,17 @@ class EngineBase(metaclass=EngineMeta):
         #
         return result
 
+    def bucket_exists(self, bucket):
+        bucket_key = self._fs_encode_name(self.format_bucket_name(bucket))
+        #
+        try:
+            self.driver.get_container(bucket_key)
+        except ContainerDoesNotExistError:
+            # anything else (auth, network) is not a missing bucket, let it surface
+            return False
+        #
+        return True
+
     def create_bucket(self, bucket, bucket_type=None, retention_days=None):
         bucket_name = self.format_bucket_name(bucket)
         bucket_key = self._fs_encode_name(bucket_name)